@@ -0,0 +1,246 @@
+"""
+Local response caches for LLM requests.
+
+Exact-match cache: responses are stored in a diskcache.Cache under
+~/.cache/prompt_llm, keyed by a SHA256 of the endpoint URL and the
+canonical (sorted-key) JSON payload. Only requests whose output is
+reproducible are cached: greedy sampling (temperature <= 0.01), a single
+completion, and no streaming. diskcache is optional; when it is not
+installed caching is disabled. use_redis() moves this cache to a shared
+Redis server (same keys, JSON values, TTL via SETEX), so developers and CI
+jobs hitting the same endpoint reuse each other's responses.
+
+Semantic cache (opt-in): the prompt, or the last chat user message, is
+embedded with all-MiniLM-L6-v2 and looked up in a FAISS inner-product
+index, so paraphrased prompts can reuse a stored response. A hit requires
+cosine similarity >= 0.95 and otherwise identical request parameters
+(numeric values within 0.05). Requires sentence-transformers and
+faiss-cpu.
+"""
+
+import functools
+import hashlib
+import os
+import sys
+from typing import Any, Optional, Tuple
+
+from _llm_client import dumps, loads
+
+CACHE_DIR = os.path.expanduser("~/.cache/prompt_llm")
+DEFAULT_TTL = 86400  # One day
+REDIS_KEY_PREFIX = "prompt_llm:"  # Namespaces our keys on a shared Redis server
+
+SEMANTIC_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_THRESHOLD = 0.95
+SEMANTIC_MAX_TEMPERATURE = 0.3  # Above this, paraphrase reuse changes the output distribution
+SEMANTIC_CANDIDATES = 5
+PARAM_TOLERANCE = 0.05
+
+_shared_cache: Optional["RedisCache"] = None
+
+
+def is_cacheable(payload: dict) -> bool:
+    """True if the payload should produce the same response every time."""
+    return (
+        payload.get("temperature", 1.0) <= 0.01
+        and payload.get("n", 1) == 1
+        and not payload.get("stream", False)
+    )
+
+
+def cache_key(url: str, payload: dict) -> str:
+    """SHA256 of the URL and payload, independent of dict key order."""
+    return hashlib.sha256(dumps({"url": url, "payload": payload}, sort_keys=True)).hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_cache() -> Any:
+    try:
+        import diskcache
+    except ImportError:  # Optional dependency; caching is skipped without it
+        return None
+    return diskcache.Cache(CACHE_DIR)
+
+
+class RedisCache:
+    """
+    Exact-match cache on a Redis server, with diskcache's get/set interface.
+
+    Redis errors are treated as misses (with one warning), so an unreachable
+    server slows nothing down beyond the failed connection attempt.
+    """
+
+    def __init__(self, url: str) -> None:
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._error = redis.RedisError
+        self._warned = False
+
+    def _warn(self, error: Exception) -> None:
+        if not self._warned:
+            self._warned = True
+            sys.stderr.write(f"⚠️  Redis cache unavailable, continuing without it: {error}\n")
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            data = self._client.get(REDIS_KEY_PREFIX + key)
+        except self._error as e:
+            self._warn(e)
+            return None
+        return None if data is None else loads(data)
+
+    def set(self, key: str, response: dict, expire: int) -> None:
+        try:
+            self._client.setex(REDIS_KEY_PREFIX + key, expire, dumps(response))
+        except self._error as e:
+            self._warn(e)
+
+
+def use_redis(url: str) -> None:
+    """
+    Use a shared Redis server (e.g. redis://host:6379/0) for lookup() and
+    store() instead of the local diskcache. Raises ImportError without redis
+    and ValueError for a malformed URL.
+    """
+    global _shared_cache
+    _shared_cache = RedisCache(url)
+
+
+def _backend() -> Any:
+    if _shared_cache is not None:
+        return _shared_cache
+    return _get_cache()
+
+
+def lookup(key: str) -> Optional[dict]:
+    """Return the cached response for key, or None on a miss."""
+    cache = _backend()
+    if cache is None:
+        return None
+    return cache.get(key)
+
+
+def store(key: str, response: dict, ttl: int = DEFAULT_TTL) -> None:
+    """Store a response for ttl seconds."""
+    cache = _backend()
+    if cache is not None:
+        cache.set(key, response, expire=ttl)
+
+
+def is_semantic_cacheable(payload: dict) -> bool:
+    """True if a near-duplicate prompt's response is an acceptable substitute."""
+    return (
+        payload.get("temperature", 1.0) <= SEMANTIC_MAX_TEMPERATURE
+        and payload.get("n", 1) == 1
+        and not payload.get("stream", False)
+    )
+
+
+def split_prompt(url: str, payload: dict) -> Tuple[str, dict]:
+    """Separate the text to embed from the parameters that must match."""
+    params = dict(payload, url=url)
+    if "messages" in payload:
+        text = payload["messages"][-1]["content"]
+        params["messages"] = payload["messages"][:-1]
+    else:
+        text = params.pop("prompt")
+    # Round-trip through JSON so params compare equal to the stored copy
+    # (e.g. SamplingParams' stop tuple comes back from loads() as a list)
+    return text, loads(dumps(params))
+
+
+def params_match(a: dict, b: dict) -> bool:
+    """Compare request parameters, allowing PARAM_TOLERANCE on numeric values."""
+    if a.keys() != b.keys():
+        return False
+    for key, value in a.items():
+        other = b[key]
+        numeric = (
+            isinstance(value, (int, float))
+            and isinstance(other, (int, float))
+            and not isinstance(value, bool)
+            and not isinstance(other, bool)
+        )
+        if numeric:
+            if abs(value - other) > PARAM_TOLERANCE:
+                return False
+        elif value != other:
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=1)
+def _get_embedder() -> Any:
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(SEMANTIC_MODEL)
+
+
+@functools.lru_cache(maxsize=128)
+def _embed(text: str) -> Any:
+    # Normalized embeddings make inner product equal to cosine similarity
+    return _get_embedder().encode([text], normalize_embeddings=True).astype("float32")
+
+
+class SemanticCache:
+    """FAISS index of prompt embeddings with responses stored in SQLite."""
+
+    def __init__(self, directory: str = CACHE_DIR) -> None:
+        import faiss
+        import sqlite3
+
+        self._faiss = faiss
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "sem.index")
+        self._db = sqlite3.connect(os.path.join(directory, "sem.sqlite"))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, params BLOB NOT NULL, response BLOB NOT NULL)"
+        )
+
+        embedder = _get_embedder()
+        if os.path.exists(self._index_path):
+            self._index = faiss.read_index(self._index_path)
+        else:
+            dimension = embedder.get_sentence_embedding_dimension()
+            self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+
+    def lookup(self, url: str, payload: dict) -> Optional[dict]:
+        """Return the response of the most similar stored prompt, or None."""
+        if self._index.ntotal == 0:
+            return None
+
+        text, params = split_prompt(url, payload)
+        k = min(SEMANTIC_CANDIDATES, self._index.ntotal)
+        scores, ids = self._index.search(_embed(text), k)
+
+        # Results are ordered by descending similarity
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id < 0 or score < SEMANTIC_THRESHOLD:
+                break
+            row = self._db.execute(
+                "SELECT params, response FROM entries WHERE id = ?", (int(entry_id),)
+            ).fetchone()
+            if row and params_match(params, loads(row[0])):
+                return loads(row[1])
+        return None
+
+    def store(self, url: str, payload: dict, response: dict) -> None:
+        """Add a response and persist the index."""
+        import numpy as np
+
+        text, params = split_prompt(url, payload)
+        cursor = self._db.execute(
+            "INSERT INTO entries (params, response) VALUES (?, ?)",
+            (dumps(params), dumps(response)),
+        )
+        self._db.commit()
+        self._index.add_with_ids(_embed(text), np.array([cursor.lastrowid], dtype="int64"))
+        self._faiss.write_index(self._index, self._index_path)
+
+
+@functools.lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """Open the semantic cache once per process (loads the embedding model)."""
+    return SemanticCache()
@@ -0,0 +1,274 @@
+"""
+Shared HTTP client for the LLM scripts.
+
+All requests go through one shared httpx.Client with HTTP/2 enabled.
+Against an HTTP/2 endpoint (e.g. the HTTPS ALB), concurrent requests are
+multiplexed over a single connection, so the TCP and TLS handshakes are
+paid once; over HTTP/1.1 keep-alive sockets are pooled and reused.
+get(), post() and post_json_async() retry connection errors, timeouts and
+transient status codes (429/5xx from a cold vLLM pod or a draining load
+balancer) with exponential backoff, honoring Retry-After when the server
+sends it.
+
+httpx and tenacity are imported on first use, so importing this module
+(e.g. for `--help`) stays cheap.
+
+JSON is encoded and decoded with orjson when it is installed, falling back
+to the standard library json module otherwise.
+
+post_json() can zstd-compress large request bodies (long prompts with
+embedded documents) to cut upload time on slow links. The server must
+decode Content-Encoding: zstd, which stock vLLM does not, so this is
+opt-in and a host that rejects a compressed body is sent plain JSON from
+then on.
+"""
+
+import functools
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; the stdlib json module is used instead
+    orjson = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    import httpx
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Status codes returned by a cold vLLM pod or a draining load balancer
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_ATTEMPTS = 5
+MAX_RETRY_AFTER = 30  # Seconds; caps a server-requested delay
+
+COMPRESSION_THRESHOLD = 8192  # Bytes; below this compression costs more than it saves
+# How a server without request decompression answers a zstd body: 415, or
+# 400/422 from trying to parse the compressed bytes as JSON. Other 400/422s
+# (e.g. prompt longer than the context window) are ordinary request errors.
+COMPRESSION_REJECTED_STATUS_CODES = {400, 415, 422}
+_DECODE_FAILURE_MARKERS = ("json decode", "json_invalid", "decod", "encoding")
+_zstd_rejected_hosts: Set[str] = set()
+
+T = TypeVar("T")
+
+
+def _once(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Cache a no-argument factory's result, like lru_cache(maxsize=1), but
+    thread-safe: concurrent first calls (test_llm_api's checks) share one
+    instance instead of each building their own.
+    """
+    lock = threading.Lock()
+    instance: List[T] = []
+
+    @functools.wraps(factory)
+    def get() -> T:
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    return get
+
+
+@_once
+def get_client() -> "httpx.Client":
+    """Create the shared HTTP/2 client on first use."""
+    import httpx
+
+    return httpx.Client(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+    )
+
+
+def create_async_client(max_connections: int) -> "httpx.AsyncClient":
+    """Create an HTTP/2 client for concurrent asyncio requests."""
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=max_connections),
+    )
+
+
+@_once
+def _retry_policy() -> Dict[str, Any]:
+    """tenacity arguments shared by the sync and async retry wrappers."""
+    import httpx
+    from tenacity import retry_if_exception_type, stop_after_attempt, wait_exponential
+
+    backoff = wait_exponential(multiplier=0.5, max=8)
+
+    def wait(retry_state: Any) -> float:
+        # Wait for Retry-After if the failed response set it, else back off exponentially
+        error = retry_state.outcome.exception()
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), MAX_RETRY_AFTER)
+        return backoff(retry_state)
+
+    return {
+        "stop": stop_after_attempt(RETRY_ATTEMPTS),
+        "wait": wait,
+        "retry": retry_if_exception_type((httpx.TransportError, httpx.HTTPStatusError)),
+        "reraise": True,
+    }
+
+
+@_once
+def _retrying_send() -> Callable[..., "httpx.Response"]:
+    """Wrap _send in the tenacity retry policy on first use."""
+    from tenacity import retry
+
+    return retry(**_retry_policy())(_send)
+
+
+def _send(method: str, url: str, stream: bool = False, **kwargs: Any) -> "httpx.Response":
+    client = get_client()
+    request = client.build_request(method, url, **kwargs)
+    response = client.send(request, stream=stream)
+    if response.status_code in RETRY_STATUS_CODES:
+        response.close()  # Release the connection of a streamed response
+        response.raise_for_status()
+    return response
+
+
+async def _send_async(
+    client: "httpx.AsyncClient", method: str, url: str, **kwargs: Any
+) -> "httpx.Response":
+    response = await client.request(method, url, **kwargs)
+    if response.status_code in RETRY_STATUS_CODES:
+        response.raise_for_status()
+    return response
+
+
+async def _request_async(
+    client: "httpx.AsyncClient", method: str, url: str, **kwargs: Any
+) -> "httpx.Response":
+    from tenacity import AsyncRetrying
+
+    # Called explicitly rather than via @retry, which relies on detecting a
+    # coroutine function and would not retry once compiled with mypyc
+    return await AsyncRetrying(**_retry_policy())(_send_async, client, method, url, **kwargs)
+
+
+def _request(method: str, url: str, stream: bool = False, **kwargs: Any) -> "httpx.Response":
+    return _retrying_send()(method, url, stream=stream, **kwargs)
+
+
+def get(url: str, **kwargs: Any) -> "httpx.Response":
+    """GET through the shared client, retrying transient failures."""
+    return _request("GET", url, **kwargs)
+
+
+def post(url: str, stream: bool = False, **kwargs: Any) -> "httpx.Response":
+    """
+    POST through the shared client, retrying transient failures.
+
+    With stream=True the body is not read; the caller must close the response.
+    """
+    return _request("POST", url, stream=stream, **kwargs)
+
+
+@functools.lru_cache(maxsize=1)
+def _zstd_compressor() -> Any:
+    try:
+        import zstandard
+    except ImportError:  # Optional; bodies are sent uncompressed without it
+        return None
+    return zstandard.ZstdCompressor(level=3)
+
+
+def _compress(url: str, body: bytes) -> Optional[Tuple[bytes, Dict[str, str]]]:
+    """Return a zstd body and its headers, or None if it should be sent as is."""
+    if len(body) <= COMPRESSION_THRESHOLD or urlsplit(url).netloc in _zstd_rejected_hosts:
+        return None
+    compressor = _zstd_compressor()
+    if compressor is None:
+        return None
+    headers = dict(JSON_HEADERS)
+    headers["Content-Encoding"] = "zstd"
+    headers["Accept-Encoding"] = "zstd, gzip"
+    return compressor.compress(body), headers
+
+
+def _rejects_compression(response: "httpx.Response") -> bool:
+    """True if the server could not decode a compressed request body."""
+    if response.status_code == 415:
+        return True
+    if response.status_code not in COMPRESSION_REJECTED_STATUS_CODES:
+        return False
+    detail = response.content[:2048].decode("utf-8", "replace").lower()
+    return any(marker in detail for marker in _DECODE_FAILURE_MARKERS)
+
+
+def post_json(
+    url: str, payload: Any, compress: bool = False, stream: bool = False, **kwargs: Any
+) -> "httpx.Response":
+    """
+    POST payload as JSON through post().
+
+    With compress, bodies over COMPRESSION_THRESHOLD are zstd-compressed.
+    If the host cannot decode the compressed body it is resent
+    uncompressed, and later requests to that host are not compressed.
+    """
+    body = dumps(payload)
+    compressed = _compress(url, body) if compress else None
+    if compressed is not None:
+        content, headers = compressed
+        response = post(url, content=content, headers=headers, stream=stream, **kwargs)
+        if response.status_code not in COMPRESSION_REJECTED_STATUS_CODES:
+            return response
+        response.read()  # Small error body; needed when stream=True
+        if not _rejects_compression(response):
+            return response
+        response.close()
+        _zstd_rejected_hosts.add(urlsplit(url).netloc)
+    return post(url, content=body, headers=JSON_HEADERS, stream=stream, **kwargs)
+
+
+async def post_json_async(
+    client: "httpx.AsyncClient", url: str, payload: Any, compress: bool = False
+) -> "httpx.Response":
+    """Async counterpart of post_json for a caller-owned AsyncClient, with the same retries."""
+    body = dumps(payload)
+    compressed = _compress(url, body) if compress else None
+    if compressed is not None:
+        content, headers = compressed
+        response = await _request_async(client, "POST", url, content=content, headers=headers)
+        if not _rejects_compression(response):
+            return response
+        _zstd_rejected_hosts.add(urlsplit(url).netloc)
+    return await _request_async(client, "POST", url, content=body, headers=JSON_HEADERS)
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Serialize obj to compact UTF-8 JSON bytes (request bodies, JSONL output)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+    return json.dumps(
+        obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys
+    ).encode()
+
+
+def dumps_pretty(obj: Any) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes indented by two spaces."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str (response bodies, streamed chunks)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -6,7 +6,13 @@ This script provides a simple interface to prompt the LLM with full control
 over all inference parameters supported by vLLM's OpenAI-compatible API.
 
 Setup:
-    pip install requests
+    pip install tenacity "httpx[http2]"
+    pip install orjson  # Optional, faster JSON encoding/decoding
+    pip install diskcache  # Optional, caches deterministic responses
+    pip install redis  # Optional, for --redis-url
+    pip install sentence-transformers faiss-cpu  # Optional, for --semantic-cache
+    pip install ijson  # Optional, low-memory parsing of large logprobs responses
+    pip install zstandard  # Optional, for --compress
 
 Usage:
     # Basic usage with default parameters
@@ -28,6 +34,16 @@ Usage:
         --frequency-penalty 0.5 \
         --presence-penalty 0.3
 
+    # Batch mode: one prompt per line, up to 8 requests in flight
+    python scripts/prompt_llm.py --url https://analysis.creativitylabsai.com \
+        --prompts-file prompts.txt \
+        --concurrency 8
+
+    # JSONL batch with per-line parameters, results written as JSONL
+    python scripts/prompt_llm.py --url https://analysis.creativitylabsai.com \
+        --batch-file sweep.jsonl \
+        --output-file results.jsonl
+
     # Via LoadBalancer (requires whitelisted IP)
     python scripts/prompt_llm.py \
         --url http://k8s-analysis-llmexter-....elb.us-east-1.amazonaws.com:8000 \
@@ -40,41 +56,257 @@ Usage:
 """
 
 import argparse
+import functools
 import sys
-import requests
-import json
 import time
-from typing import Optional, List, Tuple
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, List, Tuple, Union
 
+import _llm_cache
+from _llm_client import (
+    create_async_client,
+    dumps,
+    dumps_pretty,
+    loads,
+    post_json,
+    post_json_async,
+)
 
-def prompt_completion(
-    base_url: str,
-    model_name: str,
-    prompt: str,
-    max_tokens: int = 512,
-    temperature: float = 0.7,
-    top_p: float = 1.0,
-    top_k: int = -1,
-    frequency_penalty: float = 0.0,
-    presence_penalty: float = 0.0,
-    repetition_penalty: float = 1.0,
-    stop: Optional[List[str]] = None,
-    stream: bool = False,
-    n: int = 1,
-    best_of: Optional[int] = None,
-    logprobs: Optional[int] = None,
-    echo: bool = False,
-    min_tokens: int = 0,
-    use_beam_search: bool = False,
-    length_penalty: float = 1.0,
+if TYPE_CHECKING:
+    import httpx
+
+# Heavier and optional dependencies (httpx, asyncio, ijson, the cache
+# backends, the embedding model) are imported inside the code paths that
+# need them, so `--help` and simple requests start quickly.
+
+# Always sent in chat mode so every request starts with the same token prefix,
+# letting vLLM's automatic prefix caching reuse the system prompt's KV cache
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant."
+
+SEP = "=" * 60
+THIN_SEP = "─" * 60
+
+
+def send_request(
+    url: str,
+    payload: dict,
+    on_token: Optional[Callable[[str], None]] = None,
+    cache_ttl: Optional[int] = None,
+    semantic_cache: bool = False,
+    minimal: bool = False,
+    compress: bool = False,
 ) -> Tuple[dict, float]:
     """
-    Send a text completion request with full parameter control.
+    POST a completion payload and return (response, elapsed_time).
 
-    Parameters:
-        base_url: Base URL of the LLM API
-        model_name: Model identifier
-        prompt: Text prompt to complete
+    Streaming payloads are consumed incrementally by read_stream and
+    returned in the same shape as a non-streamed response. When cache_ttl
+    is set, deterministic requests are served from the local response
+    cache (with an elapsed_time of 0.0) and stored there on a miss. With
+    semantic_cache, low-temperature requests can also be answered from a
+    stored response to a near-identical prompt.
+
+    With minimal (and ijson installed), a non-streamed body is parsed
+    incrementally by parse_minimal, keeping only what print_response
+    reads. Such partial responses are not cached. compress zstd-encodes
+    large request bodies (see _llm_client.post_json).
+    """
+    import httpx
+
+    stream = payload.get("stream", False)
+    lazy = minimal and not stream and _load_ijson() is not None
+
+    key = None
+    if cache_ttl and _llm_cache.is_cacheable(payload):
+        key = _llm_cache.cache_key(url, payload)
+        cached = _llm_cache.lookup(key)
+        if cached is not None:
+            return cached, 0.0
+
+    semantic = None
+    if semantic_cache and _llm_cache.is_semantic_cacheable(payload):
+        semantic = _llm_cache.get_semantic_cache()
+        cached = semantic.lookup(url, payload)
+        if cached is not None:
+            return cached, 0.0
+
+    try:
+        start_time = time.perf_counter()
+        response = post_json(
+            url, payload, compress=compress, timeout=60, stream=stream or lazy
+        )
+        try:
+            response.raise_for_status()
+            if stream:
+                return read_stream(
+                    response, start_time, chat="messages" in payload, on_token=on_token
+                )
+            if lazy:
+                return parse_minimal(response), time.perf_counter() - start_time
+            elapsed_time = time.perf_counter() - start_time
+            result = loads(response.content)
+        finally:
+            response.close()  # Streamed bodies hold the connection until closed
+
+        if key is not None and cache_ttl:
+            _llm_cache.store(key, result, ttl=cache_ttl)
+        if semantic is not None:
+            semantic.store(url, payload, result)
+        return result, elapsed_time
+    except httpx.HTTPError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    except ValueError as e:  # e.g. an HTML error page from a gateway
+        print(f"❌ Error: invalid JSON in response: {e}")
+        sys.exit(1)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_ijson() -> Any:
+    try:
+        import ijson
+    except ImportError:  # Optional; responses are parsed eagerly without it
+        return None
+    return ijson
+
+
+class _ByteStreamReader:
+    """File-like view of an httpx response body, for parsers that call read()."""
+
+    def __init__(self, response: "httpx.Response") -> None:
+        self._chunks = response.iter_bytes()
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:  # ijson probes the source type with read(0)
+            return b""
+        return next(self._chunks, b"")
+
+
+def parse_minimal(response: "httpx.Response") -> dict:
+    """
+    Parse a completion response body in one streaming pass with ijson.
+
+    Keeps each choice's text (or chat message), index and finish_reason,
+    whether logprobs were returned, and the usage counts. Large logprobs
+    arrays are skipped over instead of being built as Python objects.
+    Raises ValueError if the body is not valid JSON.
+    """
+    result: Dict[str, Any] = {"choices": []}
+    usage: Dict[str, Any] = {}
+    choice: Dict[str, Any] = {}
+
+    ijson = _load_ijson()
+    try:
+        for prefix, event, value in ijson.parse(_ByteStreamReader(response), use_float=True):
+            if prefix == "choices.item" and event == "start_map":
+                choice = {"index": len(result["choices"]), "finish_reason": None, "logprobs": None}
+                result["choices"].append(choice)
+            elif prefix == "choices.item.index":
+                choice["index"] = value
+            elif prefix == "choices.item.text":
+                choice["text"] = value
+            elif prefix == "choices.item.message.content":
+                choice["message"] = {"role": "assistant", "content": value}
+            elif prefix == "choices.item.finish_reason":
+                choice["finish_reason"] = value
+            elif prefix == "choices.item.logprobs" and event in ("start_map", "start_array"):
+                choice["logprobs"] = True  # print_response only reports presence
+            elif prefix.startswith("usage.") and event == "number" and prefix.count(".") == 1:
+                usage[prefix[len("usage."):]] = value
+    except ijson.JSONError as e:  # Not a ValueError, unlike the json/orjson errors
+        raise ValueError(e) from e
+
+    if usage:
+        result["usage"] = usage
+    return result
+
+
+def read_stream(
+    response: "httpx.Response",
+    start_time: float,
+    chat: bool,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> Tuple[dict, float]:
+    """
+    Consume a server-sent-events response, passing text to on_token as it arrives.
+
+    Returns the assembled response and total elapsed time. Streaming
+    metrics are attached under "_stream": time to first token, and decode
+    throughput measured from the first token to the end of the stream.
+    """
+    choices: Dict[int, dict] = {}
+    usage = None
+    first_token_time = None
+    fragments = 0
+
+    for line in response.iter_lines():
+        if not line or not line.startswith("data: "):
+            continue
+        data = line[len("data: "):]
+        if data == "[DONE]":
+            break
+
+        chunk = loads(data)
+        if chunk.get("usage"):
+            usage = chunk["usage"]
+        for choice in chunk.get("choices", []):
+            index = choice.get("index", 0)
+            entry = choices.setdefault(index, {"index": index, "text": "", "finish_reason": None})
+            text = (choice.get("delta", {}).get("content") if chat else choice.get("text")) or ""
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                fragments += 1
+                entry["text"] += text
+                if on_token and index == 0:
+                    on_token(text)
+            if choice.get("finish_reason"):
+                entry["finish_reason"] = choice["finish_reason"]
+
+    end_time = time.perf_counter()
+
+    result: Dict[str, Any] = {"choices": []}
+    for index in sorted(choices):
+        entry = choices[index]
+        if chat:
+            result["choices"].append(
+                {
+                    "index": index,
+                    "message": {"role": "assistant", "content": entry["text"]},
+                    "finish_reason": entry["finish_reason"],
+                }
+            )
+        else:
+            result["choices"].append(entry)
+    if usage:
+        result["usage"] = usage
+
+    if first_token_time is not None:
+        tokens = usage.get("completion_tokens", fragments) if usage else fragments
+        decode_time = end_time - first_token_time
+        result["_stream"] = {
+            "time_to_first_token_seconds": round(first_token_time - start_time, 3),
+            "decode_tokens_per_second": (
+                round(tokens / decode_time, 2) if decode_time > 0 else None
+            ),
+        }
+
+    return result, end_time - start_time
+
+
+def write_token(text: str) -> None:
+    """Print a streamed text fragment immediately."""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+@dataclass(frozen=True, slots=True)
+class SamplingParams:
+    """
+    Inference parameters shared by completion and chat requests.
+
+    Attributes:
         max_tokens: Maximum tokens to generate (default: 512)
         temperature: Sampling temperature 0.0-2.0 (default: 0.7)
             Lower = more focused/deterministic, Higher = more creative/random
@@ -87,8 +319,8 @@ def prompt_completion(
             Positive values encourage new topics
         repetition_penalty: Penalize repetitions (default: 1.0)
             >1.0 = penalize, <1.0 = encourage repetition
-        stop: List of stop sequences (default: None)
-        stream: Stream response tokens (default: False)
+        stop: Stop sequences (default: None)
+        stream: Stream response tokens as server-sent events (default: False)
         n: Number of completions to generate (default: 1)
         best_of: Generate best_of completions, return best n (default: None)
         logprobs: Return log probabilities (default: None)
@@ -96,51 +328,127 @@ def prompt_completion(
         min_tokens: Minimum tokens to generate (default: 0)
         use_beam_search: Use beam search instead of sampling (default: False)
         length_penalty: Length penalty for beam search (default: 1.0)
+
+    The last five are completion-only and are not sent to the chat endpoint.
     """
-    payload = {
-        "model": model_name,
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": top_p,
-        "frequency_penalty": frequency_penalty,
-        "presence_penalty": presence_penalty,
-        "stream": stream,
-        "n": n,
-        "echo": echo,
-    }
 
-    # Add optional parameters only if non-default
-    if top_k > 0:
-        payload["top_k"] = top_k
-    if repetition_penalty != 1.0:
-        payload["repetition_penalty"] = repetition_penalty
-    if stop:
-        payload["stop"] = stop
-    if best_of:
-        payload["best_of"] = best_of
-    if logprobs:
-        payload["logprobs"] = logprobs
-    if min_tokens > 0:
-        payload["min_tokens"] = min_tokens
-    if use_beam_search:
-        payload["use_beam_search"] = use_beam_search
-        payload["length_penalty"] = length_penalty
+    max_tokens: int = 512
+    temperature: float = 0.7
+    top_p: float = 1.0
+    top_k: int = -1
+    frequency_penalty: float = 0.0
+    presence_penalty: float = 0.0
+    repetition_penalty: float = 1.0
+    stop: Optional[Tuple[str, ...]] = None
+    stream: bool = False
+    n: int = 1
+    logprobs: Optional[int] = None
+    best_of: Optional[int] = None
+    echo: bool = False
+    min_tokens: int = 0
+    use_beam_search: bool = False
+    length_penalty: float = 1.0
 
-    try:
-        start_time = time.time()
-        response = requests.post(
-            f"{base_url}/v1/completions",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=60,
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "SamplingParams":
+        """Build from parsed CLI arguments (argument names match field names)."""
+        values = {name: getattr(args, name) for name, _ in _COMPLETION_FIELDS}
+        if values["stop"]:
+            values["stop"] = tuple(values["stop"])
+        return cls(**values)
+
+    def to_payload(self, model_name: str, prompt_or_messages: Union[str, List[dict]]) -> dict:
+        """
+        Build a request body for a prompt (completion) or message list (chat).
+
+        Optional fields are only sent when they take effect (_SEND_IF);
+        the rest are always sent, since vLLM's defaults differ from ours
+        (e.g. max_tokens=16, temperature=1.0).
+        """
+        chat = not isinstance(prompt_or_messages, str)
+        payload: Dict[str, Any] = {
+            "model": model_name,
+            ("messages" if chat else "prompt"): prompt_or_messages,
+        }
+        payload.update(
+            (name, getattr(self, name))
+            for name, _ in (_CHAT_FIELDS if chat else _COMPLETION_FIELDS)
+            if name not in _SEND_IF or _SEND_IF[name](self)
         )
-        elapsed_time = time.time() - start_time
-        response.raise_for_status()
-        return response.json(), elapsed_time
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error: {e}")
-        sys.exit(1)
+        if self.stream:
+            # Final chunk carries token usage, needed for streaming throughput
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+
+# When to send each optional field; a value that disables the feature
+# (top_k <= 0, logprobs=0, ...) is left to the server
+_SEND_IF: Dict[str, Callable[[SamplingParams], bool]] = {
+    "top_k": lambda p: p.top_k > 0,
+    "repetition_penalty": lambda p: p.repetition_penalty != 1.0,
+    "stop": lambda p: bool(p.stop),
+    "logprobs": lambda p: bool(p.logprobs),
+    "best_of": lambda p: bool(p.best_of),
+    "min_tokens": lambda p: p.min_tokens > 0,
+    "use_beam_search": lambda p: p.use_beam_search,
+    "length_penalty": lambda p: p.use_beam_search,  # Only used by beam search
+}
+_COMPLETION_ONLY = frozenset(["best_of", "echo", "min_tokens", "use_beam_search", "length_penalty"])
+_COMPLETION_FIELDS = tuple((f.name, f.default) for f in fields(SamplingParams))
+_CHAT_FIELDS = tuple(item for item in _COMPLETION_FIELDS if item[0] not in _COMPLETION_ONLY)
+
+
+def build_chat_payload(
+    model_name: str,
+    system_message: Optional[str],
+    user_message: str,
+    params: SamplingParams,
+) -> dict:
+    """Build the /v1/chat/completions request body (see prompt_chat for parameters)."""
+    system_message = system_message or DEFAULT_SYSTEM_MESSAGE
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message},
+    ]
+    return params.to_payload(model_name, messages)
+
+
+def prompt_completion(
+    base_url: str,
+    model_name: str,
+    prompt: str,
+    params: SamplingParams = SamplingParams(),
+    on_token: Optional[Callable[[str], None]] = None,
+    cache_ttl: Optional[int] = None,
+    semantic_cache: bool = False,
+    minimal: bool = False,
+    compress: bool = False,
+) -> Tuple[dict, float]:
+    """
+    Send a text completion request with full parameter control.
+
+    Parameters:
+        base_url: Base URL of the LLM API
+        model_name: Model identifier
+        prompt: Text prompt to complete
+        params: Inference parameters (see SamplingParams)
+        on_token: Called with each text fragment as it arrives when streaming
+        cache_ttl: Seconds to cache deterministic responses locally (default: None = off)
+        semantic_cache: Reuse responses to near-duplicate prompts (default: False)
+        minimal: Return only the fields print_response needs, parsed
+            incrementally (default: False). Use when the full JSON is not needed
+        compress: zstd-compress request bodies over 8 KB; the server must
+            accept Content-Encoding: zstd (default: False)
+    """
+    return send_request(
+        f"{base_url}/v1/completions",
+        params.to_payload(model_name, prompt),
+        on_token=on_token,
+        cache_ttl=cache_ttl,
+        semantic_cache=semantic_cache,
+        minimal=minimal,
+        compress=compress,
+    )
 
 
 def prompt_chat(
@@ -148,127 +456,426 @@ def prompt_chat(
     model_name: str,
     system_message: Optional[str],
     user_message: str,
-    max_tokens: int = 512,
-    temperature: float = 0.7,
-    top_p: float = 1.0,
-    top_k: int = -1,
-    frequency_penalty: float = 0.0,
-    presence_penalty: float = 0.0,
-    repetition_penalty: float = 1.0,
-    stop: Optional[List[str]] = None,
-    stream: bool = False,
-    n: int = 1,
-    logprobs: Optional[int] = None,
+    params: SamplingParams = SamplingParams(),
+    on_token: Optional[Callable[[str], None]] = None,
+    cache_ttl: Optional[int] = None,
+    semantic_cache: bool = False,
+    minimal: bool = False,
+    compress: bool = False,
 ) -> Tuple[dict, float]:
     """
     Send a chat completion request with full parameter control.
 
     Parameters: Same as prompt_completion, plus:
-        system_message: Optional system message to set assistant behavior
+        system_message: System message to set assistant behavior
+            (default: None = DEFAULT_SYSTEM_MESSAGE). It is always sent first, so
+            a long, stable system prompt is prefix-cached by vLLM across calls
         user_message: User's message/question
     """
-    messages = []
-    if system_message:
-        messages.append({"role": "system", "content": system_message})
-    messages.append({"role": "user", "content": user_message})
-
-    payload = {
-        "model": model_name,
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": top_p,
-        "frequency_penalty": frequency_penalty,
-        "presence_penalty": presence_penalty,
-        "stream": stream,
-        "n": n,
+    return send_request(
+        f"{base_url}/v1/chat/completions",
+        build_chat_payload(model_name, system_message, user_message, params),
+        on_token=on_token,
+        cache_ttl=cache_ttl,
+        semantic_cache=semantic_cache,
+        minimal=minimal,
+        compress=compress,
+    )
+
+
+async def send_request_async(
+    client: "httpx.AsyncClient",
+    url: str,
+    payload: dict,
+    cache_ttl: Optional[int] = None,
+    compress: bool = False,
+) -> Tuple[dict, float]:
+    """
+    Async send_request for batches: exact-match cache, then a POST.
+
+    Errors are raised (httpx.HTTPError, ValueError) rather than exiting so
+    one failed prompt does not abort a batch.
+    """
+    key = None
+    if cache_ttl and _llm_cache.is_cacheable(payload):
+        key = _llm_cache.cache_key(url, payload)
+        cached = _llm_cache.lookup(key)
+        if cached is not None:
+            return cached, 0.0
+
+    start_time = time.perf_counter()
+    response = await post_json_async(client, url, payload, compress=compress)
+    elapsed_time = time.perf_counter() - start_time
+    response.raise_for_status()
+    result = loads(response.content)
+
+    if key is not None and cache_ttl:
+        _llm_cache.store(key, result, ttl=cache_ttl)
+    return result, elapsed_time
+
+
+async def prompt_completion_async(
+    client: "httpx.AsyncClient",
+    base_url: str,
+    model_name: str,
+    prompt: str,
+    params: SamplingParams,
+    compress: bool = False,
+    cache_ttl: Optional[int] = None,
+) -> Tuple[dict, float]:
+    """Async text completion over a shared client (see send_request_async)."""
+    payload = params.to_payload(model_name, prompt)
+    return await send_request_async(
+        client, f"{base_url}/v1/completions", payload, cache_ttl, compress
+    )
+
+
+async def prompt_chat_async(
+    client: "httpx.AsyncClient",
+    base_url: str,
+    model_name: str,
+    system_message: Optional[str],
+    user_message: str,
+    params: SamplingParams,
+    compress: bool = False,
+    cache_ttl: Optional[int] = None,
+) -> Tuple[dict, float]:
+    """Async chat completion over a shared client (see send_request_async)."""
+    payload = build_chat_payload(model_name, system_message, user_message, params)
+    return await send_request_async(
+        client, f"{base_url}/v1/chat/completions", payload, cache_ttl, compress
+    )
+
+
+# One batch request: (prompt or chat user message, chat system message, params)
+BatchJob = Tuple[str, Optional[str], SamplingParams]
+
+
+async def run_batch(
+    args: argparse.Namespace, jobs: List[BatchJob]
+) -> List[Tuple[str, Optional[dict], float, Optional[str]]]:
+    """
+    Send every job concurrently, at most args.concurrency in flight.
+
+    A single HTTP/2 AsyncClient is shared by all requests, so prompts are
+    multiplexed over one connection where the server supports HTTP/2 and
+    TCP + TLS setup is not repeated per prompt.
+    Returns (prompt, response, elapsed_time, error) tuples in input order.
+    """
+    import asyncio
+
+    import httpx
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with create_async_client(args.concurrency) as client:
+
+        async def run_one(job: BatchJob) -> Tuple[str, Optional[dict], float, Optional[str]]:
+            prompt, system_message, params = job
+            async with semaphore:
+                try:
+                    if args.mode == "chat":
+                        response, elapsed_time = await prompt_chat_async(
+                            client,
+                            args.url,
+                            args.model,
+                            system_message=system_message,
+                            user_message=prompt,
+                            params=params,
+                            compress=args.compress,
+                            cache_ttl=args.cache_ttl,
+                        )
+                    else:
+                        response, elapsed_time = await prompt_completion_async(
+                            client,
+                            args.url,
+                            args.model,
+                            prompt=prompt,
+                            params=params,
+                            compress=args.compress,
+                            cache_ttl=args.cache_ttl,
+                        )
+                    return prompt, response, elapsed_time, None
+                except httpx.HTTPError as e:
+                    return prompt, None, 0.0, str(e)
+                except ValueError as e:  # A non-JSON body must not abort the whole batch
+                    return prompt, None, 0.0, f"invalid JSON in response: {e}"
+
+        return await asyncio.gather(*(run_one(job) for job in jobs))
+
+
+def print_response(
+    response: dict,
+    mode: str,
+    elapsed_time: float,
+    show_metadata: bool = False,
+    show_content: bool = True,
+) -> None:
+    """Pretty print the response (show_content=False when it was already streamed)."""
+    # Collect the lines and write them at once; --n 10 --logprobs 5 would
+    # otherwise cost one locked stdout write per line
+    parts: List[str] = []
+    choices = response.get("choices") or []
+    if choices:
+        for i, choice in enumerate(choices):
+            if len(choices) > 1:
+                parts += ["\n" + SEP, f"Completion {i+1}:", SEP]
+            if show_content:
+                # str(): chat content is null for tool calls, printed as "None"
+                parts.append(
+                    str(choice["message"]["content"] if mode == "chat" else choice["text"])
+                )
+
+            if show_metadata:
+                parts += [
+                    "\n" + THIN_SEP,
+                    f"Finish reason: {choice.get('finish_reason', 'N/A')}",
+                ]
+                if "logprobs" in choice and choice["logprobs"]:
+                    parts.append("Logprobs available: Yes")
+    else:
+        parts.append("❌ No response generated")
+
+    if show_metadata:
+        parts += ["\n" + THIN_SEP, "Performance Metrics:"]
+        if elapsed_time == 0.0:
+            parts.append("  Request latency: 0.000s (served from cache)")
+        else:
+            parts.append(f"  Request latency: {elapsed_time:.3f}s")
+
+        usage = response.get("usage")
+        if usage is not None:
+            completion_tokens = usage.get("completion_tokens", 0)
+            if completion_tokens > 0 and elapsed_time > 0:
+                tokens_per_sec = completion_tokens / elapsed_time
+                parts.append(f"  Tokens per second: {tokens_per_sec:.2f}")
+
+        stream_metrics = response.get("_stream")
+        if stream_metrics:
+            ttft = stream_metrics["time_to_first_token_seconds"]
+            parts.append(f"  Time to first token: {ttft:.3f}s")
+            if stream_metrics["decode_tokens_per_second"] is not None:
+                decode_rate = stream_metrics["decode_tokens_per_second"]
+                parts.append(f"  Decode tokens per second: {decode_rate:.2f}")
+
+        if usage is not None:
+            parts += [
+                "\n" + THIN_SEP,
+                "Usage Statistics:",
+                f"  Prompt tokens: {usage.get('prompt_tokens', 'N/A')}",
+                f"  Completion tokens: {usage.get('completion_tokens', 'N/A')}",
+                f"  Total tokens: {usage.get('total_tokens', 'N/A')}",
+            ]
+
+    if parts:  # Empty for streamed output without --show-metadata
+        sys.stdout.write("\n".join(parts) + "\n")
+        sys.stdout.flush()
+
+
+def timing_metadata(response: dict, elapsed_time: float) -> dict:
+    """Latency and throughput figures attached to JSON output as "_timing"."""
+    completion_tokens = response.get("usage", {}).get("completion_tokens", 0)
+    timing = {
+        # Wall clock for correlating with server logs; durations use perf_counter
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "request_latency_seconds": round(elapsed_time, 3),
+        "tokens_per_second": (
+            round(completion_tokens / elapsed_time, 2)
+            if elapsed_time > 0 and completion_tokens > 0
+            else None
+        ),
     }
+    # Streaming adds time to first token and decode throughput
+    timing.update(response.get("_stream", {}))
+    return timing
 
-    # Add optional parameters only if non-default
-    if top_k > 0:
-        payload["top_k"] = top_k
-    if repetition_penalty != 1.0:
-        payload["repetition_penalty"] = repetition_penalty
-    if stop:
-        payload["stop"] = stop
-    if logprobs:
-        payload["logprobs"] = logprobs
 
+def batch_record(
+    prompt: str, response: Optional[dict], elapsed_time: float, error: Optional[str]
+) -> Dict[str, Any]:
+    """JSONL record for one batch result: the response (or error) plus its prompt."""
+    if response is None:
+        return {"_prompt": prompt, "_error": error}
+    record = dict(response, _prompt=prompt)
+    record["_timing"] = timing_metadata(response, elapsed_time)
+    return record
+
+
+def run_prompts_file(args: argparse.Namespace, params: SamplingParams) -> None:
+    """Send every line of --prompts-file concurrently and print the results in order."""
     try:
-        start_time = time.time()
-        response = requests.post(
-            f"{base_url}/v1/chat/completions",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=60,
-        )
-        elapsed_time = time.time() - start_time
-        response.raise_for_status()
-        return response.json(), elapsed_time
-    except requests.exceptions.RequestException as e:
+        with open(args.prompts_file, encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    except OSError as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
 
+    if not prompts:
+        print(f"❌ No prompts found in {args.prompts_file}")
+        sys.exit(1)
+
+    import asyncio
 
-def print_response(
-    response: dict, mode: str, elapsed_time: float, show_metadata: bool = False
-):
-    """Pretty print the response."""
-    if mode == "chat":
-        if "choices" in response and len(response["choices"]) > 0:
-            for i, choice in enumerate(response["choices"]):
-                content = choice["message"]["content"]
-                if len(response["choices"]) > 1:
-                    print(f"\n{'='*60}")
-                    print(f"Completion {i+1}:")
-                    print(f"{'='*60}")
-                print(content)
-
-                if show_metadata:
-                    print(f"\n{'─'*60}")
-                    print(f"Finish reason: {choice.get('finish_reason', 'N/A')}")
-                    if "logprobs" in choice and choice["logprobs"]:
-                        print(f"Logprobs available: Yes")
-        else:
-            print("❌ No response generated")
-    else:  # completion mode
-        if "choices" in response and len(response["choices"]) > 0:
-            for i, choice in enumerate(response["choices"]):
-                text = choice["text"]
-                if len(response["choices"]) > 1:
-                    print(f"\n{'='*60}")
-                    print(f"Completion {i+1}:")
-                    print(f"{'='*60}")
-                print(text)
-
-                if show_metadata:
-                    print(f"\n{'─'*60}")
-                    print(f"Finish reason: {choice.get('finish_reason', 'N/A')}")
-                    if "logprobs" in choice and choice["logprobs"]:
-                        print(f"Logprobs available: Yes")
+    start_time = time.perf_counter()
+    jobs = [(prompt, args.system, params) for prompt in prompts]
+    results = asyncio.run(run_batch(args, jobs))
+    total_time = time.perf_counter() - start_time
+
+    failed = 0
+    for i, (prompt, response, elapsed_time, error) in enumerate(results, start=1):
+        if response is None:
+            failed += 1
+
+        if args.json:
+            # One JSON object per line so the output can be consumed as JSONL
+            print(dumps(batch_record(prompt, response, elapsed_time, error)).decode())
+            continue
+
+        label = "User" if args.mode == "chat" else "Prompt"
+        print(f"[{i}/{len(results)}] {label}: {prompt}\n")
+        print(THIN_SEP)
+        if response is None:
+            print(f"❌ Error: {error}")
         else:
-            print("❌ No response generated")
+            print_response(response, args.mode, elapsed_time, args.show_metadata)
+        print(f"\n{SEP}\n")
 
-    if show_metadata:
-        print(f"\n{'─'*60}")
-        print("Performance Metrics:")
-        print(f"  Request latency: {elapsed_time:.3f}s")
+    if not args.json:
+        print(
+            f"Batch complete: {len(results) - failed}/{len(results)} succeeded "
+            f"in {total_time:.3f}s (concurrency {args.concurrency})\n"
+        )
 
-        if "usage" in response:
-            completion_tokens = response['usage'].get('completion_tokens', 0)
-            if completion_tokens > 0 and elapsed_time > 0:
-                tokens_per_sec = completion_tokens / elapsed_time
-                print(f"  Tokens per second: {tokens_per_sec:.2f}")
+    if failed:
+        sys.exit(1)
+
+
+def check_override(name: str, value: Any, default: Any) -> Any:
+    """
+    Validate a --batch-file override against the type of its SamplingParams
+    field (inferred from the field's default) and return the value to use.
+    """
+    if name == "stop":
+        if isinstance(value, str):
+            return (value,)
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            return tuple(value) or None
+        if value is None:
+            return None
+        raise ValueError('"stop" must be a string or a list of strings')
+
+    if value is None and default is None:  # logprobs, best_of
+        return None
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            raise ValueError(f'"{name}" must be true or false')
+    elif isinstance(default, float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'"{name}" must be a number')
+        value = float(value)
+    elif isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'"{name}" must be an integer')
+    return value
+
+
+def load_batch_file(
+    path: str, params: SamplingParams, system_message: Optional[str]
+) -> List[BatchJob]:
+    """
+    Read --batch-file JSONL into batch jobs.
+
+    Each line is an object with "prompt" (or "user_message" in chat mode),
+    an optional "system" message, and any SamplingParams field, e.g.
+    {"prompt": "...", "max_tokens": 128}. Fields it omits keep their
+    command-line values. Raises ValueError on a malformed line.
+    """
+    defaults = dict(_COMPLETION_FIELDS)
+    jobs: List[BatchJob] = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = loads(line)
+            except ValueError as e:
+                raise ValueError(f"line {line_number}: invalid JSON ({e})") from None
+            if not isinstance(entry, dict):
+                raise ValueError(f"line {line_number}: expected a JSON object")
+
+            entry = dict(entry)
+            if "prompt" in entry and "user_message" in entry:
+                raise ValueError(
+                    f'line {line_number}: set "prompt" or "user_message", not both'
+                )
+            prompt = entry.pop("prompt", None) or entry.pop("user_message", None)
+            if not isinstance(prompt, str) or not prompt:
+                raise ValueError(f"line {line_number}: missing \"prompt\"")
+            system = entry.pop("system", system_message)
+            if system is not None and not isinstance(system, str):
+                raise ValueError(f'line {line_number}: "system" must be a string')
+
+            unknown = set(entry) - set(defaults)
+            if unknown:
+                raise ValueError(f"line {line_number}: unknown fields {sorted(unknown)}")
+            for name, value in entry.items():
+                try:
+                    entry[name] = check_override(name, value, defaults[name])
+                except ValueError as e:
+                    raise ValueError(f"line {line_number}: {e}") from None
+            if entry.get("stream"):
+                raise ValueError(f"line {line_number}: streaming is not supported in batches")
 
-        if "usage" in response:
-            print(f"\n{'─'*60}")
-            print("Usage Statistics:")
-            print(f"  Prompt tokens: {response['usage'].get('prompt_tokens', 'N/A')}")
-            print(f"  Completion tokens: {response['usage'].get('completion_tokens', 'N/A')}")
-            print(f"  Total tokens: {response['usage'].get('total_tokens', 'N/A')}")
+            jobs.append((prompt, system, replace(params, **entry) if entry else params))
+    return jobs
 
 
-def main():
+def run_batch_file(args: argparse.Namespace, params: SamplingParams) -> None:
+    """Send every line of --batch-file concurrently and write the results as JSONL."""
+    try:
+        jobs = load_batch_file(args.batch_file, params, args.system)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error in {args.batch_file}: {e}")
+        sys.exit(1)
+
+    if not jobs:
+        print(f"❌ No prompts found in {args.batch_file}")
+        sys.exit(1)
+
+    import asyncio
+
+    start_time = time.perf_counter()
+    results = asyncio.run(run_batch(args, jobs))
+    total_time = time.perf_counter() - start_time
+
+    # Input order is kept, so line N of the output answers line N of the input
+    lines = [dumps(batch_record(*result)) for result in results]
+    output = b"\n".join(lines) + b"\n"
+    if args.output_file:
+        try:
+            with open(args.output_file, "wb") as f:
+                f.write(output)
+        except OSError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(output)
+        sys.stdout.buffer.flush()
+
+    failed = sum(1 for _, response, _, _ in results if response is None)
+    if args.output_file and not args.json:
+        print(
+            f"Batch complete: {len(results) - failed}/{len(results)} succeeded "
+            f"in {total_time:.3f}s (concurrency {args.concurrency}), "
+            f"results in {args.output_file}\n"
+        )
+
+    if failed:
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
     parser = argparse.ArgumentParser(
         description="Prompt the LLM with full inference parameter control",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -291,6 +898,12 @@ Examples:
   # Multiple completions
   %(prog)s --prompt "Complete this: Once upon a time" \\
       --n 3 --max-tokens 50
+
+  # Batch of prompts (one per line), 8 requests in flight
+  %(prog)s --prompts-file prompts.txt --concurrency 8
+
+  # JSONL batch, e.g. {"prompt": "...", "max_tokens": 128} per line
+  %(prog)s --batch-file sweep.jsonl --output-file results.jsonl
         """,
     )
 
@@ -319,14 +932,45 @@ Examples:
         "--prompt",
         help="Text prompt for completion mode (required for completion mode)",
     )
-    parser.add_argument(
+    system_group = parser.add_mutually_exclusive_group()
+    system_group.add_argument(
         "--system",
-        help="System message for chat mode (optional)",
+        help=(
+            "System message for chat mode (default: "
+            f"\"{DEFAULT_SYSTEM_MESSAGE}\"). Always sent first, so a long, stable "
+            "system prompt is reused from vLLM's prefix cache across calls"
+        ),
+    )
+    system_group.add_argument(
+        "--system-file",
+        help="Read the chat system message from a file (read once per run)",
     )
     parser.add_argument(
         "--user-message",
         help="User message for chat mode (required for chat mode)",
     )
+    batch_group = parser.add_mutually_exclusive_group()
+    batch_group.add_argument(
+        "--prompts-file",
+        help="File with one prompt (or chat user message) per line; sends all prompts concurrently",
+    )
+    batch_group.add_argument(
+        "--batch-file",
+        help=(
+            'JSONL file with one request per line, e.g. {"prompt": "...", "max_tokens": 128}; '
+            'lines may set "system" and any generation parameter. Results are written as JSONL'
+        ),
+    )
+    parser.add_argument(
+        "--output-file",
+        help="Write --batch-file results to this file instead of stdout",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum requests in flight with --prompts-file or --batch-file (default: 4)",
+    )
 
     # Generation parameters
     parser.add_argument(
@@ -417,7 +1061,17 @@ Examples:
     parser.add_argument(
         "--stream",
         action="store_true",
-        help="Stream response (not implemented in this script)",
+        help="Stream tokens as they are generated (adds time-to-first-token to metadata)",
+    )
+
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help=(
+            "zstd-compress request bodies over 8 KB (long prompts). The server or "
+            "ingress must accept Content-Encoding: zstd; falls back to plain JSON if "
+            "it is rejected. Requires zstandard"
+        ),
     )
 
     # Output options
@@ -432,23 +1086,87 @@ Examples:
         help="Output raw JSON response",
     )
 
-    args = parser.parse_args()
+    # Caching
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=_llm_cache.DEFAULT_TTL,
+        help=(
+            "Seconds to cache deterministic responses (temperature <= 0.01, n=1, "
+            f"no streaming) in {_llm_cache.CACHE_DIR}, 0 to disable "
+            f"(default: {_llm_cache.DEFAULT_TTL})"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always send the request, bypassing the local response cache",
+    )
+    parser.add_argument(
+        "--redis-url",
+        help=(
+            "Keep the deterministic-response cache on a shared Redis server "
+            "(e.g. redis://host:6379/0) instead of locally. Requires redis"
+        ),
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help=(
+            "Reuse responses to near-duplicate prompts (cosine similarity >= 0.95, "
+            "temperature <= 0.3). Requires sentence-transformers and faiss-cpu"
+        ),
+    )
+
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse and validate command-line arguments (default: sys.argv)."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
 
     # Validate arguments
-    if args.mode == "completion" and not args.prompt:
-        parser.error("--prompt is required for completion mode")
-    if args.mode == "chat" and not args.user_message:
-        parser.error("--user-message is required for chat mode")
+    if not (args.prompts_file or args.batch_file):
+        if args.mode == "completion" and not args.prompt:
+            parser.error("--prompt is required for completion mode")
+        if args.mode == "chat" and not args.user_message:
+            parser.error("--user-message is required for chat mode")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.system_file:
+        try:
+            with open(args.system_file, encoding="utf-8") as f:
+                args.system = f.read().strip()
+        except OSError as e:
+            parser.error(f"cannot read --system-file: {e}")
+    if args.no_cache:
+        args.cache_ttl = 0
+        args.semantic_cache = False
+    if args.stream and args.n > 1:
+        parser.error("--stream supports a single completion (--n 1)")
+    if args.stream and (args.prompts_file or args.batch_file):
+        parser.error("--stream cannot be combined with --prompts-file or --batch-file")
+    if args.semantic_cache and (args.prompts_file or args.batch_file):
+        parser.error("--semantic-cache cannot be combined with --prompts-file or --batch-file")
+    if args.output_file and not args.batch_file:
+        parser.error("--output-file requires --batch-file")
 
-    if args.stream:
-        print("⚠️  Warning: Streaming is not implemented in this script")
-        args.stream = False
+    return args
 
-    # Display configuration
-    if not args.json:
-        print(f"\n{'='*60}")
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Send the request(s) described by parsed arguments and print the results.
+
+    Library entry point: a driver can call run(parse_args([...])) without
+    going through the command line.
+    """
+    # Display configuration, unless stdout carries JSON
+    if not (args.json or args.batch_file and not args.output_file):
+        print(f"\n{SEP}")
         print(f"🤖 LLM Prompt - {args.mode.upper()} Mode")
-        print(f"{'='*60}")
+        print(SEP)
         print(f"URL: {args.url}")
         print(f"Model: {args.model}")
         print(f"Max tokens: {args.max_tokens}")
@@ -466,15 +1184,56 @@ Examples:
             print(f"Stop sequences: {args.stop}")
         if args.n > 1:
             print(f"Completions: {args.n}")
-        print(f"{'='*60}\n")
+        if args.prompts_file:
+            print(f"Prompts file: {args.prompts_file}")
+        if args.batch_file:
+            print(f"Batch file: {args.batch_file}")
+        if args.prompts_file or args.batch_file:
+            print(f"Concurrency: {args.concurrency}")
+        print(f"{SEP}\n")
+
+    params = SamplingParams.from_args(args)
+
+    if args.redis_url:
+        try:
+            _llm_cache.use_redis(args.redis_url)
+        except ImportError as e:
+            print(f"❌ --redis-url requires redis: {e}")
+            sys.exit(1)
+        except ValueError as e:  # Malformed URL, e.g. missing redis://
+            print(f"❌ Invalid --redis-url: {e}")
+            sys.exit(1)
+
+    if args.semantic_cache:
+        try:
+            _llm_cache.get_semantic_cache()
+        except ImportError as e:
+            print(f"❌ --semantic-cache requires sentence-transformers and faiss-cpu: {e}")
+            sys.exit(1)
+
+    if args.prompts_file:
+        run_prompts_file(args, params)
+        return
+    if args.batch_file:
+        run_batch_file(args, params)
+        return
+
+    # Large responses (logprobs, several choices) are parsed down to what
+    # print_response shows; --json needs the full body
+    minimal = not args.json and bool(params.logprobs or params.n > 1 or params.best_of)
+
+    # Tokens are written as they arrive, except in JSON mode
+    stream_writer = write_token if args.stream and not args.json else None
 
     # Make request
     if args.mode == "chat":
         if not args.json:
-            if args.system:
-                print(f"System: {args.system}")
+            if args.system_file:
+                print(f"System: {args.system_file} ({len(args.system)} chars)")
+            else:
+                print(f"System: {args.system or DEFAULT_SYSTEM_MESSAGE}")
             print(f"User: {args.user_message}\n")
-            print(f"{'─'*60}")
+            print(THIN_SEP)
             print("Assistant:")
 
         response, elapsed_time = prompt_chat(
@@ -482,62 +1241,55 @@ Examples:
             model_name=args.model,
             system_message=args.system,
             user_message=args.user_message,
-            max_tokens=args.max_tokens,
-            temperature=args.temperature,
-            top_p=args.top_p,
-            top_k=args.top_k,
-            frequency_penalty=args.frequency_penalty,
-            presence_penalty=args.presence_penalty,
-            repetition_penalty=args.repetition_penalty,
-            stop=args.stop,
-            stream=args.stream,
-            n=args.n,
-            logprobs=args.logprobs,
+            on_token=stream_writer,
+            cache_ttl=args.cache_ttl,
+            semantic_cache=args.semantic_cache,
+            minimal=minimal,
+            compress=args.compress,
+            params=params,
         )
     else:  # completion mode
         if not args.json:
             print(f"Prompt: {args.prompt}\n")
-            print(f"{'─'*60}")
+            print(THIN_SEP)
             print("Response:")
 
         response, elapsed_time = prompt_completion(
             base_url=args.url,
             model_name=args.model,
             prompt=args.prompt,
-            max_tokens=args.max_tokens,
-            temperature=args.temperature,
-            top_p=args.top_p,
-            top_k=args.top_k,
-            frequency_penalty=args.frequency_penalty,
-            presence_penalty=args.presence_penalty,
-            repetition_penalty=args.repetition_penalty,
-            stop=args.stop,
-            stream=args.stream,
-            n=args.n,
-            best_of=args.best_of,
-            logprobs=args.logprobs,
-            echo=args.echo,
-            min_tokens=args.min_tokens,
-            use_beam_search=args.use_beam_search,
-            length_penalty=args.length_penalty,
+            on_token=stream_writer,
+            cache_ttl=args.cache_ttl,
+            semantic_cache=args.semantic_cache,
+            minimal=minimal,
+            compress=args.compress,
+            params=params,
         )
 
     # Display response
     if args.json:
-        # Add timing metadata to JSON output
-        response_with_timing = response.copy()
-        response_with_timing["_timing"] = {
-            "request_latency_seconds": round(elapsed_time, 3),
-            "tokens_per_second": (
-                round(response.get("usage", {}).get("completion_tokens", 0) / elapsed_time, 2)
-                if elapsed_time > 0 and response.get("usage", {}).get("completion_tokens", 0) > 0
-                else None
-            )
-        }
-        print(json.dumps(response_with_timing, indent=2))
+        # Add timing metadata in place; the response is not used afterwards,
+        # and copying a large (logprobs) body just to add a key is wasted work
+        response["_timing"] = timing_metadata(response, elapsed_time)
+        response.pop("_stream", None)  # Folded into _timing
+        sys.stdout.flush()
+        sys.stdout.buffer.write(dumps_pretty(response) + b"\n")
+        sys.stdout.buffer.flush()
     else:
-        print_response(response, args.mode, elapsed_time, args.show_metadata)
-        print(f"\n{'='*60}\n")
+        if args.stream:
+            print()  # End the streamed line
+        print_response(
+            response,
+            args.mode,
+            elapsed_time,
+            args.show_metadata,
+            show_content=not args.stream,
+        )
+        print(f"\n{SEP}\n")
+
+
+def main() -> None:
+    run(parse_args())
 
 
 if __name__ == "__main__":
@@ -3,8 +3,10 @@
 Test script for LLM API deployed on EKS
 
 Setup:
-    pip install requests
-    # Or in venv: source .venv/bin/activate && pip install requests
+    pip install tenacity "httpx[http2]"
+    # Or in venv: source .venv/bin/activate && pip install tenacity "httpx[http2]"
+    pip install orjson  # Optional, faster JSON encoding/decoding
+    pip install redis  # Optional, for --redis-url
 
 Usage:
     # Test via LoadBalancer (requires whitelisted IP)
@@ -17,46 +19,79 @@ Usage:
     kubectl port-forward -n analysis svc/llm 8000:8000 &
     python scripts/test_llm_api.py
     kill %1
+
+    # CI: share deterministic completion results between runs via Redis
+    python scripts/test_llm_api.py --url http://localhost:8000 --redis-url redis://cache:6379/0
 """
 
 import argparse
 import sys
-import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+import _llm_cache
+from _llm_client import JSON_HEADERS, dumps, get, loads, post
+
+
+def report(message: str) -> None:
+    """Write a message in one call so output from concurrent checks doesn't interleave."""
+    sys.stdout.write(message + "\n")
+
+
+def post_completion(url: str, payload: dict, use_cache: bool) -> Tuple[dict, bool]:
+    """
+    POST a completion payload and return (response, cached).
+
+    With use_cache, deterministic payloads (see _llm_cache.is_cacheable) are
+    answered from the shared Redis cache when a previous run stored them.
+    """
+    key = None
+    if use_cache and _llm_cache.is_cacheable(payload):
+        key = _llm_cache.cache_key(url, payload)
+        cached = _llm_cache.lookup(key)
+        if cached is not None:
+            return cached, True
+
+    response = post(url, headers=JSON_HEADERS, content=dumps(payload), timeout=30)
+    response.raise_for_status()
+    data = loads(response.content)
+    if key is not None and data.get("choices"):
+        _llm_cache.store(key, data)
+    return data, False
 
 
 def test_health(base_url: str) -> bool:
     """Test the health endpoint"""
     try:
-        response = requests.get(f"{base_url}/health", timeout=5)
+        response = get(f"{base_url}/health", timeout=5)
         response.raise_for_status()
-        print("✅ Health check passed")
+        report("✅ Health check passed")
         return True
     except Exception as e:
-        print(f"❌ Health check failed: {e}")
+        report(f"❌ Health check failed: {e}")
         return False
 
 
 def test_list_models(base_url: str) -> bool:
     """Test the models listing endpoint"""
     try:
-        response = requests.get(f"{base_url}/v1/models", timeout=5)
+        response = get(f"{base_url}/v1/models", timeout=5)
         response.raise_for_status()
-        data = response.json()
+        data = loads(response.content)
 
         if "data" in data and len(data["data"]) > 0:
             model_id = data["data"][0]["id"]
-            print(f"✅ Models endpoint working - found model: {model_id}")
+            report(f"✅ Models endpoint working - found model: {model_id}")
             return True
         else:
-            print("❌ No models found in response")
+            report("❌ No models found in response")
             return False
     except Exception as e:
-        print(f"❌ List models failed: {e}")
+        report(f"❌ List models failed: {e}")
         return False
 
 
-def test_chat_completion(base_url: str, model_name: str) -> bool:
+def test_chat_completion(base_url: str, model_name: str, use_cache: bool = False) -> bool:
     """Test the chat completion endpoint"""
     try:
         payload = {
@@ -71,61 +106,49 @@ def test_chat_completion(base_url: str, model_name: str) -> bool:
             "temperature": 0.7,
         }
 
-        response = requests.post(
-            f"{base_url}/v1/chat/completions",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30,
+        data, cached = post_completion(
+            f"{base_url}/v1/chat/completions", payload, use_cache
         )
-        response.raise_for_status()
-        data = response.json()
 
         if "choices" in data and len(data["choices"]) > 0:
             content = data["choices"][0]["message"]["content"]
-            print(f"✅ Chat completion working")
-            print(f"   Response: {content}")
+            label = " (cached)" if cached else ""
+            report(f"✅ Chat completion working{label}\n   Response: {content}")
             return True
         else:
-            print("❌ No choices in response")
+            report("❌ No choices in response")
             return False
     except Exception as e:
-        print(f"❌ Chat completion failed: {e}")
+        report(f"❌ Chat completion failed: {e}")
         return False
 
 
-def test_text_completion(base_url: str, model_name: str) -> bool:
+def test_text_completion(base_url: str, model_name: str, use_cache: bool = False) -> bool:
     """Test the text completion endpoint"""
     try:
         payload = {
             "model": model_name,
             "prompt": "The capital of France is",
             "max_tokens": 10,
-            "temperature": 0.1,
+            "temperature": 0.0,  # Greedy, so the result can be cached
         }
 
-        response = requests.post(
-            f"{base_url}/v1/completions",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30,
-        )
-        response.raise_for_status()
-        data = response.json()
+        data, cached = post_completion(f"{base_url}/v1/completions", payload, use_cache)
 
         if "choices" in data and len(data["choices"]) > 0:
             text = data["choices"][0]["text"]
-            print(f"✅ Text completion working")
-            print(f"   Response: {text}")
+            label = " (cached)" if cached else ""
+            report(f"✅ Text completion working{label}\n   Response: {text}")
             return True
         else:
-            print("❌ No choices in response")
+            report("❌ No choices in response")
             return False
     except Exception as e:
-        print(f"❌ Text completion failed: {e}")
+        report(f"❌ Text completion failed: {e}")
         return False
 
 
-def main():
+def main() -> None:
     parser = argparse.ArgumentParser(description="Test LLM API endpoints")
     parser.add_argument(
         "--url",
@@ -138,25 +161,43 @@ def main():
         help="Model name to use for completions",
     )
     parser.add_argument("--skip-health", action="store_true", help="Skip health check")
+    parser.add_argument(
+        "--redis-url",
+        help=(
+            "Shared Redis cache (e.g. redis://host:6379/0): deterministic completion "
+            "checks reuse a response stored by an earlier run against the same URL"
+        ),
+    )
 
     args = parser.parse_args()
 
-    print(f"\n🧪 Testing LLM API at: {args.url}\n")
-
-    results = []
+    if args.redis_url:
+        try:
+            _llm_cache.use_redis(args.redis_url)
+        except ImportError as e:
+            print(f"❌ --redis-url requires redis: {e}")
+            sys.exit(1)
+        except ValueError as e:  # Malformed URL, e.g. missing redis://
+            print(f"❌ Invalid --redis-url: {e}")
+            sys.exit(1)
 
-    # Test health endpoint
-    if not args.skip_health:
-        results.append(("Health", test_health(args.url)))
-
-    # Test models endpoint
-    results.append(("List Models", test_list_models(args.url)))
-
-    # Test chat completion
-    results.append(("Chat Completion", test_chat_completion(args.url, args.model)))
+    print(f"\n🧪 Testing LLM API at: {args.url}\n")
 
-    # Test text completion
-    results.append(("Text Completion", test_text_completion(args.url, args.model)))
+    # The checks are independent, so run them concurrently; total time is
+    # that of the slowest check. Results keep this order for the summary.
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {}
+        if not args.skip_health:
+            futures["Health"] = executor.submit(test_health, args.url)
+        futures["List Models"] = executor.submit(test_list_models, args.url)
+        use_cache = bool(args.redis_url)
+        futures["Chat Completion"] = executor.submit(
+            test_chat_completion, args.url, args.model, use_cache
+        )
+        futures["Text Completion"] = executor.submit(
+            test_text_completion, args.url, args.model, use_cache
+        )
+        results = [(name, future.result()) for name, future in futures.items()]
 
     # Summary
     print("\n" + "=" * 50)